@@ -3,22 +3,35 @@
 """
 
 import os
-import time
-from openai import OpenAI
+import re
+import asyncio
+from openai import AsyncOpenAI
 from tqdm import tqdm
 
-client = OpenAI(
+# 同时发出的翻译请求数，受限于API的并发/速率限制
+MAX_CONCURRENCY = 8
+# 每次请求打包翻译的字幕块数
+BATCH_SIZE = 30
+# 单个字幕块的请求超时（秒），批量请求按块数放大
+TIMEOUT = 30
+
+SYSTEM_PROMPT = "你是一个专业的字幕翻译助手。请将以下英文文本翻译成中文，保持原文的格式和换行。注意：多行文本可能是一个完整的句子，请确保翻译的连贯性。只返回翻译结果，不要添加任何解释。"
+BATCH_SYSTEM_PROMPT = "你是一个专业的字幕翻译助手。以下是多条编号的英文字幕，每条以“序号>>>”开头。请逐条翻译成中文，保留每条开头的“序号>>>”前缀和条目顺序，不要合并或拆分条目，保持每条内部的换行。注意：相邻字幕可能是一个完整的句子，请确保翻译的连贯性。只返回翻译结果，不要添加任何解释。"
+BATCH_PREFIX = re.compile(r'^(\d+)>>>', re.MULTILINE)
+
+client = AsyncOpenAI(
     api_key="AccessKey",  # 请替换成您的AccessKey
     base_url="https://ark.cn-beijing.volces.com/api/v3"
     )
 
-def translate_text(text, max_retries=3, timeout=30):
+async def translate_text(text, system_prompt=SYSTEM_PROMPT, max_retries=3, timeout=TIMEOUT):
+    # 重试全部失败时返回None，由调用方决定退回方式
     for attempt in range(max_retries):
         try:
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="doubao-1-5-pro-32k-250115",
                 messages=[
-                    {"role": "system", "content": "你是一个专业的字幕翻译助手。请将以下英文文本翻译成中文，保持原文的格式和换行。注意：多行文本可能是一个完整的句子，请确保翻译的连贯性。只返回翻译结果，不要添加任何解释。"},
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": text}
                 ],
                 timeout=timeout
@@ -26,9 +39,69 @@ def translate_text(text, max_retries=3, timeout=30):
             return response.choices[0].message.content
         except Exception as e:
             if attempt < max_retries - 1:
-                time.sleep((attempt + 1) * 2)
+                await asyncio.sleep((attempt + 1) * 2)
             else:
+                return None
+
+def parse_block(block):
+    lines = block.split('\n')
+    if len(lines) < 3:  # 跳过无效块
+        return None
+        
+    # 前两行是序号和时间码，保持不变，剩余行是字幕文本
+    return '\n'.join(lines[:2]), '\n'.join(lines[2:])
+
+def split_batch(text, count):
+    # 按“序号>>>”前缀拆分批量翻译结果，请求失败、序号对不上或有空条目时返回None
+    if text is None:
+        return None
+    parts = BATCH_PREFIX.split(text)
+    numbers = [int(n) for n in parts[1::2]]
+    if numbers != list(range(1, count + 1)):
+        return None
+    texts = [t.strip() for t in parts[2::2]]
+    if not all(texts):
+        return None
+    return texts
+
+async def translate_batch(batch, sem):
+    texts = [text for _, text in batch]
+    numbered = '\n'.join(f"{n}>>>{text}" for n, text in enumerate(texts, 1))
+    
+    async with sem:
+        result = await translate_text(numbered, BATCH_SYSTEM_PROMPT, timeout=TIMEOUT * len(texts))
+    translated = split_batch(result, len(texts))
+    
+    # 批量请求失败或结果无法解析时，退回逐块翻译，仍失败的块保留原文
+    if translated is None:
+        tqdm.write(f"批量翻译失败，退回逐块翻译: {len(texts)} 个字幕块")
+        async def translate_one(text):
+            async with sem:
+                translated_text = await translate_text(text)
+            if translated_text is None:
+                tqdm.write(f"翻译失败，保留原文: {text}")
                 return text
+            return translated_text
+        translated = await asyncio.gather(*[translate_one(text) for text in texts])
+    
+    # 组合翻译后的块
+    return [f"{header}\n{text}" for (header, _), text in zip(batch, translated)]
+
+async def translate_blocks(subtitle_blocks):
+    sem = asyncio.Semaphore(MAX_CONCURRENCY)
+    parsed = [p for p in (parse_block(block) for block in subtitle_blocks) if p is not None]
+    batches = [parsed[i:i + BATCH_SIZE] for i in range(0, len(parsed), BATCH_SIZE)]
+    results = [None] * len(batches)
+    
+    async def run(i, batch):
+        results[i] = await translate_batch(batch, sem)
+        pbar.update(len(batch))
+    
+    # 使用tqdm创建进度条
+    with tqdm(total=len(parsed), desc="翻译进度") as pbar:
+        await asyncio.gather(*[run(i, batch) for i, batch in enumerate(batches)])
+    
+    return [block for batch in results for block in batch]
 
 def process_srt_file(input_file, output_file):
     print(f"正在处理文件: {input_file}")
@@ -47,37 +120,11 @@ def process_srt_file(input_file, output_file):
         print("没有找到有效的字幕块")
         return
     
-    # 创建或清空输出文件
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('')
+    # 分批并发翻译所有字幕块，结果按原顺序写入
+    translated_blocks = asyncio.run(translate_blocks(subtitle_blocks))
     
-    # 使用tqdm创建进度条
-    for i, block in enumerate(tqdm(subtitle_blocks, desc="翻译进度")):
-        try:
-            lines = block.split('\n')
-            if len(lines) < 3:  # 跳过无效块
-                continue
-                
-            # 前两行是序号和时间码，保持不变
-            header = '\n'.join(lines[:2])
-            
-            # 剩余行是字幕文本
-            subtitle_text = '\n'.join(lines[2:])
-            
-            # 翻译字幕文本
-            translated_text = translate_text(subtitle_text)
-            
-            # 组合翻译后的块
-            translated_block = f"{header}\n{translated_text}"
-            
-            # 写入文件
-            with open(output_file, 'a', encoding='utf-8') as f:
-                if i > 0:  # 如果不是第一个块，添加空行
-                    f.write('\n\n')
-                f.write(translated_block)
-                
-        except Exception as e:
-            continue
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('\n\n'.join(translated_blocks))
 
     print(f"翻译完成！输出文件：{output_file}")
 